@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# ## Premier League Club Investment Report Builder
+# Builds the static report of "Premier League Club Investment Analysis.py" (observations, outlier tables,
+# the three charts and the final recommendation) without rerunning the whole notebook.
+#
+# Every section is fingerprinted from its own inputs (the slice of data it reads, the thresholds and the
+# score weights). The rendered Markdown/HTML of a section and its figure are cached under that fingerprint,
+# so a rerun only re-renders the sections whose inputs changed and reuses everything else.
+#
+# The reports link to copies of the figures in `<out>/figures`, never to the cache itself, so old cache entries
+# can be pruned (`--prune DAYS`) without breaking the published reports.
+#
+# Usage:
+#     python pl_report.py "PL Final Data.csv" --out reports
+#     python pl_report.py leagues/*.csv --out reports --format md
+#     python pl_report.py leagues/*.csv --out reports --prune 7
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import shutil
+import time
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+# Bump this when the rendering of a section changes, so old cache entries are not reused
+RENDER_VERSION = 2
+
+# prune() leaves temporary files younger than this alone, they may belong to a run that is still writing them
+TMP_GRACE_SECONDS = 60 * 60
+
+# Thresholds used in the notebook
+DEFAULT_THRESHOLDS = {
+    'exclude_min_matches': 900,       # clubs with at least this many matches are removed from the analysis
+    'iqr_multiplier': 1.5,            # whisker length used to flag outliers
+    'score_experience_matches': 372,  # "relatively high experience" for the score (average matches played)
+    'current_season': 2023,           # clubs that last played this year are currently in the Premier League
+}
+
+# Score weights from "4. Final Recommendations Framework"
+DEFAULT_WEIGHTS = {
+    'experience': 10,
+    'high_winning_rate': 15,
+    'low_loss_rate': 15,
+    'low_drawn_and_loss_rate': 10,
+    'high_clean_sheet_and_winning_rate': 10,
+    'winner': 15,
+    'runner_up': 10,
+    'currently_playing': 15,
+}
+
+RATE_COLUMNS = ['Winning Rate', 'Drawn Rate', 'Loss Rate', 'Clean Sheet Rate']
+
+
+def resolve_settings(thresholds=None, weights=None):
+    """Merge the overrides into the default thresholds and weights, raise ValueError on unknown keys."""
+    resolved = []
+    for name, overrides, defaults in [('thresholds', thresholds, DEFAULT_THRESHOLDS),
+                                      ('weights', weights, DEFAULT_WEIGHTS)]:
+        overrides = {} if overrides is None else overrides
+        if not isinstance(overrides, dict):
+            raise ValueError(f'{name} must be a JSON object, got {overrides!r}')
+        unknown = sorted(set(overrides) - set(defaults))
+        if unknown:
+            raise ValueError(f"unknown {name}: {', '.join(unknown)} (expected one of: {', '.join(defaults)})")
+        for key, value in overrides.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f'{name} value of {key!r} must be a number, got {value!r}')
+        resolved.append({**defaults, **overrides})
+    return resolved
+
+
+# ## 1. Preparing the data
+
+def load_clubs(path):
+    """Read a league csv and apply the cleaning steps of the notebook."""
+    df = pd.read_csv(path)
+
+    # Remove the serial numbers in front of the club names
+    df['Club'] = df['Club'].str.replace(r'\d+', '', regex=True).str.strip()
+
+    # Clubs without a title or a runner-up finish have null or '-' values
+    df['Winners'] = pd.to_numeric(df['Winners'], errors='coerce').fillna(0).astype('Int64')
+    df['Runners-up'] = df['Runners-up'].replace('-', 0)
+    df['Runners-up'] = pd.to_numeric(df['Runners-up'], errors='coerce').fillna(0).astype('Int64')
+
+    # 'TeamLaunch' mixes years with full dates, keep only the year
+    df['TeamLaunch'] = df['TeamLaunch'].astype(str).str.extract(r'(\d{4})', expand=False)
+
+    # 'lastplayed_pl' is in the format 'Apr-23', keep it an integer even if a value cannot be parsed
+    df['lastplayed_pl'] = pd.to_datetime(df['lastplayed_pl'], format='%b-%y', errors='coerce').dt.year
+    df['lastplayed_pl'] = df['lastplayed_pl'].astype('Int64')
+    return df
+
+
+def add_rates(df, thresholds):
+    """Drop the experienced clubs and normalise the totals by the number of matches played."""
+    df = df[df['Matches Played'] < thresholds['exclude_min_matches']].reset_index(drop=True)
+
+    df['Winning Rate'] = (df['Win'] / df['Matches Played'])*100
+    df['Loss Rate'] = (df['Loss'] / df['Matches Played'])*100
+    df['Drawn Rate'] = (df['Drawn'] / df['Matches Played'])*100
+    df['Clean Sheet Rate'] = (df['Clean Sheets'] / df['Matches Played'])*100
+    df['Avg Goals Per Match'] = (df['Goals'] / df['Matches Played']).round()
+    return df
+
+
+def add_scores(df, thresholds, weights):
+    """Score each club on the pre defined metrics."""
+    upper_bound_WinningRate = df['Winning Rate'].quantile(0.75)
+    lower_bound_LosingRate = df['Loss Rate'].quantile(0.25)
+    lower_bound_DrawnRate = df['Drawn Rate'].quantile(0.25)
+    upper_bound_CleanSheetRate = df['Clean Sheet Rate'].quantile(0.75)
+
+    df = df.copy()
+    df['scores'] = np.zeros(len(df))
+    df.loc[df['Matches Played'] >= thresholds['score_experience_matches'], 'scores'] += weights['experience']
+    df.loc[df['Winning Rate'] >= upper_bound_WinningRate, 'scores'] += weights['high_winning_rate']
+    df.loc[df['Loss Rate'] <= lower_bound_LosingRate, 'scores'] += weights['low_loss_rate']
+    df.loc[(df['Drawn Rate'] <= lower_bound_DrawnRate) & (df['Loss Rate'] <= lower_bound_LosingRate),
+           'scores'] += weights['low_drawn_and_loss_rate']
+    df.loc[(df['Clean Sheet Rate'] >= upper_bound_CleanSheetRate) & (df['Winning Rate'] >= upper_bound_WinningRate),
+           'scores'] += weights['high_clean_sheet_and_winning_rate']
+    df.loc[df['Winners'] == 1, 'scores'] += weights['winner']
+    df.loc[df['Runners-up'] == 1, 'scores'] += weights['runner_up']
+    df.loc[df['lastplayed_pl'] == thresholds['current_season'], 'scores'] += weights['currently_playing']
+    return df.sort_values(by='scores', ascending=False).reset_index(drop=True)
+
+
+def iqr_bounds(series, multiplier):
+    """Return the (lower, upper) whiskers of a column."""
+    Q1 = series.quantile(0.25)
+    Q3 = series.quantile(0.75)
+    IQR = Q3 - Q1
+    return Q1 - multiplier * IQR, Q3 + multiplier * IQR
+
+
+# ## 2. Fingerprints and cache
+
+def fingerprint(name, frames=(), params=None):
+    """Hash everything a section reads: its data frames, its parameters and the render version."""
+    digest = hashlib.sha256()
+    digest.update(f'{name}:{RENDER_VERSION}'.encode())
+    for frame in frames:
+        # hash_pandas_object does not include the column names, so add them separately
+        digest.update(json.dumps([str(c) for c in frame.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class SectionCache:
+    """Content addressed store of rendered sections and figures, shared by all the league reports."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, f'{key}.{extension}')
+
+    def get(self, key):
+        # Another run may prune the entry at any point, which just makes it a cache miss
+        try:
+            with open(self.path(key, 'json'), encoding='utf-8') as f:
+                section = json.load(f)
+            # Figures are stored next to the entry, a section is only usable if its figure is still there.
+            # Mark both as used, prune() removes the entries that have not been used for a while
+            if section.get('figure'):
+                section['figure'] = os.path.join(self.directory, section['figure'])
+                os.utime(section['figure'])
+            os.utime(self.path(key, 'json'))
+        except (OSError, ValueError):
+            return None
+        return section
+
+    def put(self, key, section):
+        # Write to a temporary file first so that a crash never leaves a half written entry behind
+        path = self.path(key, 'json')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({**section, 'figure': section['figure'] and os.path.basename(section['figure'])}, f)
+        os.replace(tmp, path)
+
+    def prune(self, max_age_days):
+        """Remove the entries (and leftover temporary files) not used in the last `max_age_days` days."""
+        cutoff = time.time() - max_age_days * 24 * 60 * 60
+        removed = 0
+        tmp_cutoff = min(cutoff, time.time() - TMP_GRACE_SECONDS)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < (tmp_cutoff if name.endswith('.tmp') else cutoff):
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                # Removed by another run in the meantime
+                pass
+        return removed
+
+
+# ## 3. Rendering the sections
+
+def table(df, columns=None, floatfmt='{:.1f}'):
+    """Render a data frame as Markdown and HTML tables (without needing tabulate)."""
+    df = df if columns is None else df[columns]
+
+    def cell(value):
+        if isinstance(value, (float, np.floating)) and not pd.isna(value):
+            return floatfmt.format(value)
+        return '' if pd.isna(value) else str(value)
+
+    rows = [[cell(v) for v in row] for row in df.itertuples(index=False)]
+    header = [str(c) for c in df.columns]
+    if not rows:
+        return {'md': '_No clubs._', 'html': '<p><em>No clubs.</em></p>'}
+
+    md = ['| ' + ' | '.join(header) + ' |', '|' + '---|' * len(header)]
+    md += ['| ' + ' | '.join(row) + ' |' for row in rows]
+    body = ''.join('<tr>' + ''.join(f'<td>{html.escape(v)}</td>' for v in row) + '</tr>' for row in rows)
+    head = ''.join(f'<th>{html.escape(h)}</th>' for h in header)
+    return {'md': '\n'.join(md), 'html': f'<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'}
+
+
+def heading(text):
+    """Render a subheading inside a section."""
+    return {'md': f'### {text}', 'html': f'<h3>{html.escape(text)}</h3>'}
+
+
+def section(title, parts, figure=None):
+    """Put a title, paragraphs/headings/tables and an optional figure together."""
+    md = [f'## {title}']
+    out = [f'<h2>{html.escape(title)}</h2>']
+    for part in parts:
+        if isinstance(part, dict):
+            md.append(part['md'])
+            out.append(part['html'])
+        else:
+            md.append(part)
+            out.append(f'<p>{html.escape(part)}</p>')
+    return {'title': title, 'md': '\n\n'.join(md), 'html': '\n'.join(out), 'figure': figure}
+
+
+def save_figure(plt, figure):
+    """Save the current figure through a temporary file, like SectionCache.put, and close it."""
+    tmp = f'{figure}.{os.getpid()}.tmp'
+    plt.savefig(tmp, format='png', bbox_inches='tight')
+    plt.close()
+    os.replace(tmp, figure)
+
+
+def render_observations(clubs):
+    most_titles = clubs.loc[clubs['Winners'].idxmax()]
+    most_runners_up = clubs.loc[clubs['Runners-up'].idxmax()]
+    summary = clubs[['Matches Played', 'Win', 'Loss', 'Drawn', 'Goals', 'Clean Sheets']].describe().T
+    summary.insert(0, 'Column', summary.index)
+    return section('Observations', [
+        f'The dataset contains {len(clubs)} clubs. Each club played an average of '
+        f"{clubs['Matches Played'].mean():.2f} matches and scored an average of {clubs['Goals'].mean():.0f} goals "
+        f"(median {clubs['Goals'].median():.0f}).",
+        f"{most_titles['Club']} won the Premier League {most_titles['Winners']} times and "
+        f"{most_runners_up['Club']} finished as runners-up {most_runners_up['Runners-up']} times.",
+        table(summary),
+    ])
+
+
+def render_outliers(rates, thresholds):
+    multiplier = thresholds['iqr_multiplier']
+    columns = ['Club', 'Matches Played', 'Winning Rate', 'Drawn Rate', 'Loss Rate', 'Clean Sheet Rate']
+
+    lower, upper = iqr_bounds(rates['Winning Rate'], multiplier)
+    high_winning = rates[rates['Winning Rate'] > upper]
+    low_winning = rates[rates['Winning Rate'] < lower]
+    _, upper = iqr_bounds(rates['Drawn Rate'], multiplier)
+    high_drawn = rates[rates['Drawn Rate'] > upper]
+
+    return section('Outliers', [
+        f"Clubs that played {thresholds['exclude_min_matches']} matches or more are left out, "
+        f'which leaves {len(rates)} clubs. Outliers lie beyond {multiplier} IQR of the quartiles.',
+        heading('High winning rate'), table(high_winning, columns),
+        heading('Low winning rate'), table(low_winning, columns),
+        heading('High drawn rate'), table(high_drawn, columns),
+    ])
+
+
+def render_matches_chart(clubs, figure):
+    import matplotlib.pyplot as plt
+
+    plt.figure()
+    plt.hist(clubs['Matches Played'])
+    plt.xlabel('No. of Matches Played')
+    plt.ylabel('Frequency')
+    plt.title('Histogram of Matches Played')
+    save_figure(plt, figure)
+    return section('Matches Played', [], figure)
+
+
+def render_rates_chart(rates, figure):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(8, 6))
+    try:
+        plt.boxplot([rates[c] for c in RATE_COLUMNS], patch_artist=True, tick_labels=RATE_COLUMNS)
+    except TypeError:
+        # matplotlib before 3.9 only knows the 'labels' keyword used in the notebook
+        plt.boxplot([rates[c] for c in RATE_COLUMNS], patch_artist=True, labels=RATE_COLUMNS)
+    plt.title('Distribution of Winning Rate, Drawn Rate, Loss Rate and Clean Sheet Rate')
+    plt.xlabel('Winning, Drawn ,Lost Game & Clean Sheet')
+    plt.ylabel('Rate')
+    save_figure(plt, figure)
+    return section('Winning, Drawn, Loss and Clean Sheet Rates', [], figure)
+
+
+def render_scores_chart(scores, figure):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(25, 10))
+    plt.bar(scores['Club'], scores['scores'], color='blue')
+    plt.ylabel('Scores', fontsize=16)
+    plt.title('Football Club v/s performance score', fontsize=18)
+    plt.legend(['Scores'], fontsize=14)
+    plt.xticks(rotation=90, fontsize=14)
+    plt.yticks(fontsize=14)
+    plt.ylim(0, 100)
+    save_figure(plt, figure)
+    return section('Performance Scores', [], figure)
+
+
+def render_recommendation(scores, thresholds):
+    # Like in the notebook, only clubs currently playing in the Premier League are recommended
+    current = scores[scores['lastplayed_pl'] == thresholds['current_season']]
+    parts = [table(scores.head(10), ['Club', 'scores', 'Winning Rate', 'Loss Rate', 'lastplayed_pl'])]
+    if current.empty:
+        parts.insert(0, 'None of the remaining clubs is currently playing in the Premier League.')
+    else:
+        top = current.iloc[0]
+        leader = scores.iloc[0]
+        if leader['Club'] != top['Club']:
+            if pd.isna(leader['lastplayed_pl']):
+                parts.insert(0, f"{leader['Club']} has the highest score but it is not known when it last played "
+                                f"in the Premier League.")
+            else:
+                parts.insert(0, f"{leader['Club']} has the highest score but last played in the Premier League in "
+                                f"{leader['lastplayed_pl']}.")
+        parts.insert(0, f"We recommend investing in {top['Club']} (score {top['scores']:.0f}).")
+    return section('Recommendation', parts)
+
+
+# ## 4. Building the report
+
+def build_sections(path, cache, thresholds, weights):
+    """Return the sections of one league report, rendering only the ones missing from the cache."""
+    clubs = load_clubs(path)
+    rates = add_rates(clubs, thresholds)
+    scores = add_scores(rates, thresholds, weights)
+
+    # (name, renderer, data read by the section, parameters read by the section, has a figure)
+    plan = [
+        ('observations', lambda fig: render_observations(clubs), [clubs], {}, False),
+        ('outliers', lambda fig: render_outliers(rates, thresholds),
+         [rates[['Club', 'Matches Played'] + RATE_COLUMNS]],
+         {k: thresholds[k] for k in ('exclude_min_matches', 'iqr_multiplier')}, False),
+        ('matches_chart', lambda fig: render_matches_chart(clubs, fig), [clubs[['Matches Played']]], {}, True),
+        ('rates_chart', lambda fig: render_rates_chart(rates, fig), [rates[RATE_COLUMNS]], {}, True),
+        ('scores_chart', lambda fig: render_scores_chart(scores, fig), [scores[['Club', 'scores']]], {}, True),
+        ('recommendation', lambda fig: render_recommendation(scores, thresholds),
+         [scores[['Club', 'scores', 'Winning Rate', 'Loss Rate', 'lastplayed_pl']]],
+         {'current_season': thresholds['current_season']}, False),
+    ]
+
+    sections = []
+    for name, render, frames, params, has_figure in plan:
+        key = f'{name}-{fingerprint(name, frames, params)}'
+        cached = cache.get(key)
+        if cached is None:
+            cache.misses += 1
+            cached = render(cache.path(key, 'png') if has_figure else None)
+            cache.put(key, cached)
+        else:
+            cache.hits += 1
+        sections.append({**cached, 'name': name})
+    return sections
+
+
+def publish_figure(source, target):
+    """Copy a cached figure to its stable path in the output directory, return False if it was already there."""
+    with open(source, 'rb') as f:
+        content = f.read()
+    try:
+        with open(target, 'rb') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    tmp = f'{target}.{os.getpid()}.tmp'
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+    return True
+
+
+def write_report(title, sections, out_dir, fmt):
+    """Write the Markdown and/or HTML report and its figures, leaving the files alone when nothing changed."""
+    written = []
+    figures = {}
+    for s in sections:
+        if s['figure']:
+            os.makedirs(os.path.join(out_dir, 'figures'), exist_ok=True)
+            target = os.path.join(out_dir, 'figures', f"{title}-{s['name']}.png")
+            if publish_figure(s['figure'], target):
+                written.append(target)
+            figures[s['name']] = quote(f"figures/{title}-{s['name']}.png")
+
+    for extension in (['md', 'html'] if fmt == 'both' else [fmt]):
+        path = os.path.join(out_dir, f'{title}.{extension}')
+        parts = []
+        for s in sections:
+            figure = figures.get(s['name'])
+            if extension == 'md':
+                parts.append(s['md'] + (f"\n\n![{s['title']}]({figure})" if figure else ''))
+            else:
+                img = f'\n<img src="{html.escape(figure)}" alt="{html.escape(s["title"])}">' if figure else ''
+                parts.append(s['html'] + img)
+
+        if extension == 'md':
+            text = f'# {title}\n\n' + '\n\n'.join(parts) + '\n'
+        else:
+            text = (f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head>'
+                    f'<body>\n<h1>{html.escape(title)}</h1>\n' + '\n'.join(parts) + '\n</body></html>\n')
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                unchanged = f.read() == text
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            written.append(path)
+    return written
+
+
+def report_title(path):
+    """Name of the report files and figures of a league csv."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def build_report(path, out_dir='reports', fmt='both', thresholds=None, weights=None, cache=None):
+    """Build the report of one league csv and return the paths of the files that were (re)written."""
+    thresholds, weights = resolve_settings(thresholds, weights)
+    os.makedirs(out_dir, exist_ok=True)
+    cache = cache or SectionCache(os.path.join(out_dir, '.cache'))
+
+    title = report_title(path)
+    sections = build_sections(path, cache, thresholds, weights)
+    return write_report(title, sections, out_dir, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the club investment report of one or more league csv files.')
+    parser.add_argument('csv', nargs='+', help='league csv files in the format of "PL Final Data.csv"')
+    parser.add_argument('--out', default='reports', help='output directory (default: reports)')
+    parser.add_argument('--format', choices=['md', 'html', 'both'], default='both')
+    parser.add_argument('--thresholds', type=json.loads, default=None,
+                        help='JSON object overriding the thresholds, e.g. \'{"iqr_multiplier": 2}\'')
+    parser.add_argument('--weights', type=json.loads, default=None,
+                        help='JSON object overriding the score weights, e.g. \'{"winner": 20}\'')
+    parser.add_argument('--prune', type=float, metavar='DAYS', default=None,
+                        help='afterwards, remove the cache entries not used in the last DAYS days')
+    args = parser.parse_args(argv)
+    try:
+        thresholds, weights = resolve_settings(args.thresholds, args.weights)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Reports are named after the csv file, two files with the same name would overwrite each other
+    titles = {}
+    for path in args.csv:
+        other = titles.setdefault(report_title(path), path)
+        if os.path.realpath(other) != os.path.realpath(path):
+            parser.error(f'{other!r} and {path!r} would both write the report {report_title(path)!r}')
+    csvs = list(titles.values())
+
+    # Render the figures without a display
+    import matplotlib
+    matplotlib.use('Agg')
+
+    cache = SectionCache(os.path.join(args.out, '.cache'))
+    written = []
+    for path in csvs:
+        written += build_report(path, args.out, args.format, thresholds, weights, cache)
+    print(f'{len(csvs)} report(s), {len(written)} file(s) written, '
+          f'{cache.misses} section(s) rendered, {cache.hits} reused from cache')
+    if args.prune is not None:
+        print(f'{cache.prune(args.prune)} cache file(s) pruned')
+
+
+if __name__ == '__main__':
+    main()
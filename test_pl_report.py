@@ -0,0 +1,179 @@
+# Tests for the incremental report builder in pl_report.py, run with `python -m pytest -q`
+
+import os
+import shutil
+
+import matplotlib
+import pytest
+
+matplotlib.use('Agg')
+
+import pl_report  # noqa: E402
+
+CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PL Final Data.csv')
+SECTIONS = 6
+
+
+@pytest.fixture
+def league(tmp_path):
+    path = tmp_path / 'league.csv'
+    shutil.copyfile(CSV, path)
+    return str(path)
+
+
+def build(league, out, **kwargs):
+    """Build the report with a fresh cache object, so that hits and misses count this run only."""
+    cache = pl_report.SectionCache(os.path.join(out, '.cache'))
+    written = pl_report.build_report(league, str(out), cache=cache, **kwargs)
+    return cache, written
+
+
+def test_first_build_renders_every_section(league, tmp_path):
+    out = tmp_path / 'reports'
+    cache, written = build(league, out)
+
+    assert (cache.hits, cache.misses) == (0, SECTIONS)
+    assert sorted(os.path.relpath(p, out) for p in written) == sorted([
+        'league.md', 'league.html',
+        os.path.join('figures', 'league-matches_chart.png'),
+        os.path.join('figures', 'league-rates_chart.png'),
+        os.path.join('figures', 'league-scores_chart.png'),
+    ])
+    # The report links to the published figures, not to the cache
+    report = (out / 'league.md').read_text()
+    assert 'figures/league-scores_chart.png' in report
+    assert '.cache' not in report
+
+    page = (out / 'league.html').read_text()
+    assert '<h3>High winning rate</h3>' in page
+    assert '###' not in page
+    assert '<img src="figures/league-scores_chart.png"' in page
+    assert '.cache' not in page
+
+
+def test_unchanged_inputs_reuse_every_section(league, tmp_path):
+    out = tmp_path / 'reports'
+    build(league, out)
+    cache, written = build(league, out)
+
+    assert (cache.hits, cache.misses) == (SECTIONS, 0)
+    assert written == []
+
+
+def test_weight_change_renders_only_score_sections(league, tmp_path):
+    out = tmp_path / 'reports'
+    build(league, out)
+    cache, written = build(league, out, weights={'winner': 20})
+
+    assert (cache.hits, cache.misses) == (SECTIONS - 2, 2)
+    assert sorted(os.path.basename(p) for p in written) == ['league-scores_chart.png', 'league.html', 'league.md']
+
+
+def test_threshold_change_keeps_sections_that_do_not_read_it(league, tmp_path):
+    out = tmp_path / 'reports'
+    build(league, out)
+    cache, _ = build(league, out, thresholds={'current_season': 2022})
+
+    # Only the scores depend on the current season, the outliers are reused
+    assert (cache.hits, cache.misses) == (SECTIONS - 2, 2)
+
+    cache, _ = build(league, out, thresholds={'current_season': 2022, 'iqr_multiplier': 2})
+    assert (cache.hits, cache.misses) == (SECTIONS - 1, 1)
+
+
+def test_data_change_renders_only_sections_reading_it(league, tmp_path):
+    out = tmp_path / 'reports'
+    build(league, out)
+
+    # Goals are only shown in the observations
+    with open(league) as f:
+        lines = f.read().splitlines()
+    row = lines[1].split(',')
+    row[5] = str(int(row[5]) + 1)
+    lines[1] = ','.join(row)
+    with open(league, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    cache, written = build(league, out)
+    assert (cache.hits, cache.misses) == (SECTIONS - 1, 1)
+    assert sorted(os.path.basename(p) for p in written) == ['league.html', 'league.md']
+
+
+def test_missing_figure_renders_the_section_again(league, tmp_path):
+    out = tmp_path / 'reports'
+    build(league, out)
+    for name in os.listdir(out / '.cache'):
+        if name.startswith('rates_chart-') and name.endswith('.png'):
+            os.remove(out / '.cache' / name)
+
+    cache, written = build(league, out)
+    assert (cache.hits, cache.misses) == (SECTIONS - 1, 1)
+    # The figure is rendered again with the same content, so nothing is published
+    assert written == []
+
+
+def test_prune_keeps_published_reports(league, tmp_path):
+    out = tmp_path / 'reports'
+    cache, _ = build(league, out)
+
+    assert cache.prune(0) > 0
+    assert os.listdir(out / '.cache') == []
+    assert (out / 'figures' / 'league-scores_chart.png').exists()
+
+    cache, written = build(league, out)
+    assert (cache.hits, cache.misses) == (0, SECTIONS)
+    assert written == []
+
+
+def test_prune_keeps_temporary_files_being_written(tmp_path):
+    cache = pl_report.SectionCache(str(tmp_path))
+    fresh = tmp_path / 'outliers-abc.json.123.tmp'
+    stale = tmp_path / 'outliers-abc.json.456.tmp'
+    fresh.write_text('{}')
+    stale.write_text('{}')
+    old = os.path.getmtime(stale) - pl_report.TMP_GRACE_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    assert cache.prune(0) == 1
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+@pytest.mark.parametrize('thresholds, weights', [
+    (None, {'winer': 99}),
+    ({'season': 2022}, None),
+    (None, 2),
+    ({'iqr_multiplier': 'x'}, None),
+])
+def test_invalid_overrides_are_rejected(league, tmp_path, thresholds, weights):
+    with pytest.raises(ValueError):
+        pl_report.build_report(league, str(tmp_path / 'reports'), thresholds=thresholds, weights=weights)
+
+
+def test_unparsable_last_played_year(league, tmp_path):
+    # Blackburn Rovers lead the scores without playing in the current season
+    with open(league) as f:
+        text = f.read()
+    with open(league, 'w') as f:
+        f.write(text.replace('Blackburn Rovers,696,262,250,184,927,210,1875,1,1,May-12',
+                             'Blackburn Rovers,696,262,250,184,927,210,1875,1,1,?'))
+
+    out = tmp_path / 'reports'
+    build(league, out, fmt='md')
+    report = (out / 'league.md').read_text()
+    assert 'We recommend investing in Leicester City' in report
+    assert 'it is not known when it last played' in report
+    assert '| 2023 |' in report
+    assert '2023.0' not in report
+    assert 'nan' not in report
+
+
+def test_csv_files_with_the_same_name_are_rejected(league, tmp_path, capsys):
+    other = tmp_path / 'other' / 'league.csv'
+    other.parent.mkdir()
+    shutil.copyfile(league, other)
+
+    with pytest.raises(SystemExit):
+        pl_report.main([league, str(other), '--out', str(tmp_path / 'reports')])
+    assert 'would both write the report' in capsys.readouterr().err
+    assert not (tmp_path / 'reports' / 'league.md').exists()